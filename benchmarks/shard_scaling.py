@@ -0,0 +1,134 @@
+"""Measure how game message throughput scales with the number of shards.
+
+Starts the sharded deployment locally (``python -m src.game.sharding``) once
+per shard count, opens a controller and two overlays in every room, and has
+each controller adjust the timer as fast as the server answers. Load is
+generated from several processes so the client side is not the bottleneck.
+
+    python benchmarks/shard_scaling.py --shards 1 4 --rooms 64 --duration 10
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import asyncio
+import tempfile
+import argparse
+import subprocess
+import multiprocessing
+from pathlib import Path
+
+import httpx
+import websockets
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+API_KEY = "bench-key"
+
+
+def wait_for_port(port: int, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Server on port {port} did not start")
+            time.sleep(0.2)
+
+
+async def drain(ws):
+    try:
+        async for _ in ws:
+            pass
+    except websockets.ConnectionClosed:
+        pass
+
+
+async def drive_room(port: int, session_uuid: str, deadline: float) -> int:
+    url = f"ws://127.0.0.1:{port}/ws/{session_uuid}"
+    async with websockets.connect(url) as controller, \
+            websockets.connect(url) as overlay_1, websockets.connect(url) as overlay_2:
+        for ws, client_type in ((controller, "controller"), (overlay_1, "overlay"), (overlay_2, "overlay")):
+            await ws.send(json.dumps({"type": "connect", "client_type": client_type}))
+        drains = [asyncio.create_task(drain(overlay_1)), asyncio.create_task(drain(overlay_2))]
+
+        operations = 0
+        delta = 1
+        while time.monotonic() < deadline:
+            await controller.send(json.dumps({"type": "adjust_timer", "seconds": delta}))
+            while json.loads(await controller.recv()).get("type") != "session_state":
+                pass
+            operations += 1
+            delta = -delta
+
+        for task in drains:
+            task.cancel()
+        return operations
+
+
+def load_worker(port: int, session_uuids: list, deadline: float, results):
+    async def run():
+        counts = await asyncio.gather(*(drive_room(port, uuid, deadline) for uuid in session_uuids))
+        return sum(counts)
+    results.put(asyncio.run(run()))
+
+
+def measure(shards: int, rooms: int, duration: float, workers: int, port: int, router_workers: int) -> float:
+    # Run from a scratch directory so benchmark sessions don't land in the repo
+    workdir = tempfile.mkdtemp(prefix="intesa-bench-")
+    shutil.copy(REPO_ROOT / "words.json", workdir)
+    env = dict(os.environ, INTESA_API_KEY=API_KEY, PYTHONPATH=str(REPO_ROOT))
+    server = subprocess.Popen(
+        [sys.executable, "-m", "src.game.sharding", "--shards", str(shards),
+         "--host", "127.0.0.1", "--port", str(port), "--base-port", str(port + 1),
+         *(["--router-workers", str(router_workers)] if router_workers else [])],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        wait_for_port(port)
+        session_uuids = [
+            httpx.post(f"http://127.0.0.1:{port}/create-session", json={"api_key": API_KEY}).json()["session_uuid"]
+            for _ in range(rooms)
+        ]
+
+        deadline = time.monotonic() + duration
+        results = multiprocessing.Queue()
+        processes = [
+            multiprocessing.Process(target=load_worker, args=(port, session_uuids[i::workers], deadline, results))
+            for i in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        total = sum(results.get() for _ in processes)
+        for process in processes:
+            process.join()
+        return total / duration
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    parser.add_argument("--rooms", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="load generator processes")
+    parser.add_argument("--router-workers", type=int, default=None, help="default: half the shard count")
+    parser.add_argument("--port", type=int, default=9800)
+    args = parser.parse_args()
+
+    print(f"{'shards':>6} {'ops/s':>10} {'speedup':>8}")
+    baseline = None
+    for shards in args.shards:
+        throughput = measure(shards, args.rooms, args.duration, args.workers, args.port, args.router_workers)
+        baseline = baseline or throughput
+        print(f"{shards:>6} {throughput:>10.0f} {throughput / baseline:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
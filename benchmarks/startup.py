@@ -0,0 +1,90 @@
+"""Measure game server cold start.
+
+Reports how long ``import src.game.server`` takes in a fresh interpreter, and
+the time from launching uvicorn until the first client has created a session
+and had its WebSocket accepted (what a player waits for after a scale-to-zero
+container wakes up).
+
+    python benchmarks/startup.py --runs 5
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import argparse
+import tempfile
+import statistics
+import subprocess
+from pathlib import Path
+
+import httpx
+import websockets
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+API_KEY = "bench-key"
+
+
+def measure_import(env: dict, workdir: str) -> float:
+    output = subprocess.check_output(
+        [sys.executable, "-c",
+         "import time; start = time.perf_counter(); import src.game.server; print(time.perf_counter() - start)"],
+        cwd=workdir, env=env, stderr=subprocess.DEVNULL
+    )
+    return float(output.decode().strip().splitlines()[-1])
+
+
+async def first_accept(port: int, started: float) -> float:
+    async with httpx.AsyncClient() as client:
+        while True:
+            try:
+                response = await client.post(f"http://127.0.0.1:{port}/create-session", json={"api_key": API_KEY})
+                break
+            except httpx.TransportError:
+                await asyncio.sleep(0.005)
+    session_uuid = response.json()["session_uuid"]
+
+    async with websockets.connect(f"ws://127.0.0.1:{port}/ws/{session_uuid}") as ws:
+        accepted = time.perf_counter() - started
+        await ws.send(json.dumps({"type": "connect", "client_type": "controller"}))
+        await ws.recv()
+    return accepted
+
+
+def measure_first_accept(env: dict, workdir: str, port: int) -> float:
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.game.server:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        return asyncio.run(first_accept(port, started))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=9850)
+    args = parser.parse_args()
+
+    # Run from a scratch directory so benchmark sessions don't land in the repo
+    workdir = tempfile.mkdtemp(prefix="intesa-startup-")
+    shutil.copy(REPO_ROOT / "words.json", workdir)
+    try:
+        print(f"{'mode':<12} {'import (ms)':>12} {'first accept (ms)':>18}")
+        for prewarm in ("1", "0"):
+            env = dict(os.environ, INTESA_API_KEY=API_KEY, INTESA_PREWARM=prewarm, PYTHONPATH=str(REPO_ROOT))
+            imports = [measure_import(env, workdir) for _ in range(args.runs)]
+            accepts = [measure_first_accept(env, workdir, args.port) for _ in range(args.runs)]
+            mode = "prewarm" if prewarm == "1" else "no prewarm"
+            print(f"{mode:<12} {statistics.median(imports) * 1000:>12.0f} {statistics.median(accepts) * 1000:>18.0f}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+import json
+import asyncio
+import itertools
+import httpx
+import websockets
+from fastapi import FastAPI, Request, Response, WebSocket, HTTPException
+from fastapi.middleware.cors import CORSMiddleware
+
+from .sharding import shard_for_session, shard_addresses
+
+app = FastAPI(title="Intesa Vincente Shard Router")
+
+# Enable CORS for development
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+shards = shard_addresses()
+next_shard = itertools.cycle(range(len(shards)))
+http_client: httpx.AsyncClient = None
+
+# Headers that describe a single hop and must not be copied between connections
+HOP_BY_HOP_HEADERS = {
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization", "te", "trailers",
+    "transfer-encoding", "upgrade", "host", "content-length", "content-encoding"
+}
+
+@app.on_event("startup")
+async def open_http_client():
+    global http_client
+    http_client = httpx.AsyncClient(timeout=10)
+
+@app.on_event("shutdown")
+async def close_http_client():
+    await http_client.aclose()
+
+async def _forward(request: Request, shard: int, body: bytes) -> Response:
+    url = f"http://{shards[shard]}{request.url.path}"
+    if request.url.query:
+        url += f"?{request.url.query}"
+    headers = {k: v for k, v in request.headers.items() if k.lower() not in HOP_BY_HOP_HEADERS}
+    
+    try:
+        upstream = await http_client.request(request.method, url, content=body, headers=headers)
+    except httpx.HTTPError as e:
+        print(f"Shard {shard} unavailable: {e}")
+        raise HTTPException(status_code=502, detail="Game server unavailable")
+    
+    headers = {k: v for k, v in upstream.headers.items() if k.lower() not in HOP_BY_HOP_HEADERS}
+    return Response(content=upstream.content, status_code=upstream.status_code, headers=headers)
+
+@app.post("/create-session")
+async def create_session(request: Request):
+    # Any shard can host a new room, the code it generates hashes back to it
+    return await _forward(request, next(next_shard), await request.body())
+
+@app.post("/join-session")
+async def join_session(request: Request):
+    body = await request.body()
+    try:
+        session_code = json.loads(body).get("session_code")
+    except (ValueError, AttributeError):
+        session_code = None
+    
+    # Malformed requests still go to a shard so clients get the usual error response
+    shard = shard_for_session(session_code, len(shards)) if isinstance(session_code, str) else 0
+    return await _forward(request, shard, body)
+
+@app.get("/api/metrics/latency")
+async def latency_metrics(request: Request):
+    # Each shard keeps its own histograms
+    metrics = []
+    for shard in range(len(shards)):
+        try:
+            response = await _forward(request, shard, b"")
+        except HTTPException:
+            metrics.append(None)  # Shard down, report the others
+            continue
+        metrics.append(json.loads(response.body) if response.status_code == 200 else None)
+    return {"shards": metrics}
+
+@app.get("/api/sessions/{session_uuid}/trace")
+async def session_trace(request: Request, session_uuid: str):
+    return await _forward(request, shard_for_session(session_uuid, len(shards)), b"")
+
+@app.websocket("/ws/{session_uuid}")
+async def websocket_endpoint(websocket: WebSocket, session_uuid: str):
+    shard = shard_for_session(session_uuid, len(shards))
+    try:
+        upstream = await websockets.connect(f"ws://{shards[shard]}/ws/{session_uuid}")
+    except (OSError, asyncio.TimeoutError, websockets.InvalidHandshake) as e:
+        # Shard is down; its own rejections (unknown session, limits) arrive as an error and close code
+        print(f"Shard {shard} unavailable for WebSocket in session {session_uuid}: {e}")
+        await websocket.close(code=1013)
+        return
+    
+    await websocket.accept()
+    
+    async def client_to_shard():
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    return
+                if message.get("text") is not None:
+                    await upstream.send(message["text"])
+                elif message.get("bytes") is not None:
+                    await upstream.send(message["bytes"])
+        except websockets.ConnectionClosed:
+            pass
+    
+    async def shard_to_client():
+        try:
+            async for message in upstream:
+                if isinstance(message, str):
+                    await websocket.send_text(message)
+                else:
+                    await websocket.send_bytes(message)
+        except websockets.ConnectionClosed:
+            pass
+    
+    tasks = [asyncio.create_task(client_to_shard()), asyncio.create_task(shard_to_client())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await upstream.close()
+    
+    # Pass the shard's close code on (e.g. 4000 when the role was taken over)
+    try:
+        await websocket.close(code=upstream.close_code or 1000)
+    except (RuntimeError, OSError):
+        pass  # Client already gone
+
+@app.api_route("/{path:path}", methods=["GET", "HEAD"])
+async def forward_static(request: Request, path: str):
+    # Every shard serves the same UI, spread the load
+    return await _forward(request, next(next_shard), b"")
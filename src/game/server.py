@@ -1,6 +1,7 @@
 import os
 import uuid
 import json
+import asyncio
 from pathlib import Path
 from typing import Dict
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
@@ -27,6 +28,26 @@ session_manager = SessionManager()
 websocket_manager = WebSocketManager()
 websocket_manager.set_session_manager(session_manager)
 
+# Background prewarm, kept so it isn't garbage collected and its failure gets reported
+prewarm_future: asyncio.Future = None
+
+def _report_prewarm(future: asyncio.Future):
+    if not future.cancelled() and future.exception():
+        print(f"Prewarm failed, initializing on first use instead: {future.exception()}")
+
+@app.on_event("startup")
+async def prewarm_managers():
+    # Startup mode: heavy pieces are built on first use, optionally warmed in the background
+    # without holding up the first accepted connection
+    global prewarm_future
+    if os.getenv("INTESA_PREWARM", "1") == "1":
+        prewarm_future = asyncio.get_running_loop().run_in_executor(session_manager.io_executor, session_manager.prewarm)
+        prewarm_future.add_done_callback(_report_prewarm)
+
+@app.on_event("shutdown")
+async def shutdown_managers():
+    session_manager.shutdown()
+
 # Serve React static files
 static_path = Path(__file__).parent.parent / "ui" / "build"
 
@@ -42,6 +63,19 @@ async def serve_buzz_audio():
         return FileResponse(str(public_buzz), media_type="audio/wav")
     raise HTTPException(status_code=404, detail="Buzz audio not found")
 
+# Latency tracing, registered before the SPA catch-all below
+@app.get("/api/metrics/latency")
+async def latency_metrics():
+    return websocket_manager.tracer.export()
+
+@app.get("/api/sessions/{session_uuid}/trace")
+async def session_trace(session_uuid: str):
+    if not websocket_manager.tracer.dump_size:
+        raise HTTPException(status_code=404, detail="Trace dumps are disabled (set INTESA_TRACE_DUMP)")
+    if not session_manager.get_session(session_uuid):
+        raise HTTPException(status_code=404, detail="Session not found")
+    return {"session_uuid": session_uuid, "traces": websocket_manager.tracer.dump(session_uuid)}
+
 if static_path.exists():
     app.mount("/static", StaticFiles(directory=str(static_path / "static")), name="static")
     
@@ -88,7 +122,7 @@ async def create_session(request: dict):
     if not api_key:
         raise HTTPException(status_code=400, detail="API key required")
     
-    session_uuid = session_manager.create_session(api_key)
+    session_uuid = await session_manager.create_session_async(api_key)
     return {"session_uuid": session_uuid}
 
 @app.post("/join-session")
@@ -101,7 +135,7 @@ async def join_session(request: dict):
     if not session_code:
         raise HTTPException(status_code=400, detail="Session code required")
     
-    session_uuid = session_manager.validate_and_join_session(api_key, session_code)
+    session_uuid = await session_manager.validate_and_join_session_async(api_key, session_code)
     return {"session_uuid": session_uuid}
 
 @app.websocket("/ws/{session_uuid}")
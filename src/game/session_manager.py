@@ -1,19 +1,134 @@
 import os
 import json
 import random
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Dict, Hashable, Optional
 from fastapi import HTTPException
-from faker import Faker
 from dotenv import load_dotenv
+from .sharding import shard_for_session
 load_dotenv()
 
+
+class Session:
+    """In-memory state of one game room.
+    
+    The JSON form sent to clients is cached; call changed() after assigning fields so it is rebuilt.
+    """
+    __slots__ = (
+        "uuid", "state", "connected_clients", "timer", "correct", "incorrect", "total_points",
+        "current_word", "pass_count", "need_new_word", "saved_timer", "_serialized"
+    )
+    
+    def __init__(self, session_uuid: str):
+        self.uuid = session_uuid
+        self.state = "lobby"
+        self.connected_clients = set()
+        self.timer = 60
+        self.correct = 0
+        self.incorrect = 0
+        self.total_points = 0
+        self.current_word = None
+        self.pass_count = 0
+        self.need_new_word = False
+        self.saved_timer = None
+        self._serialized = None
+    
+    def changed(self):
+        self._serialized = None
+    
+    def add_client(self, client_type: str) -> bool:
+        if client_type in self.connected_clients:
+            return False
+        self.connected_clients.add(client_type)
+        self.changed()
+        return True
+    
+    def remove_client(self, client_type: str):
+        if client_type in self.connected_clients:
+            self.connected_clients.remove(client_type)
+            self.changed()
+    
+    def to_dict(self) -> dict:
+        return {
+            "uuid": self.uuid,
+            "state": self.state,
+            "connected_clients": sorted(self.connected_clients),
+            "timer": self.timer,
+            "stats": {
+                "correct": self.correct,
+                "incorrect": self.incorrect,
+                "total_points": self.total_points
+            },
+            "current_word": self.current_word,
+            "pass_count": self.pass_count,
+            "need_new_word": self.need_new_word,
+            "saved_timer": self.saved_timer
+        }
+    
+    def serialized(self) -> str:
+        if self._serialized is None:
+            self._serialized = json.dumps(self.to_dict(), separators=(",", ":"), ensure_ascii=False)
+        return self._serialized
+
+
 class SessionManager:
     def __init__(self):
+        # Created on first use (or by prewarm), so importing the server stays cheap
         self.sessions_dir = Path("sessions")
-        self.sessions_dir.mkdir(exist_ok=True)
-        self.active_sessions = {}
+        self.active_sessions: Dict[str, Session] = {}
         self.api_key = os.getenv("INTESA_API_KEY", "test-key-123")
-        self.fake = Faker(['it_IT', 'en_US'])  # Italian and English for variety
+        self._fake = None
+        self._word_deck = None
+        self._word_deck_mtime = None
+        # Separate locks, so a request loading the word deck never waits behind Faker being built
+        self._fake_lock = threading.Lock()
+        self._word_deck_lock = threading.Lock()
+        # When sharded, this process only hands out codes that hash to its own shard
+        self.shard_index = int(os.getenv("INTESA_SHARD_INDEX", "0"))
+        self.shard_count = int(os.getenv("INTESA_SHARD_COUNT", "1"))
+        # Blocking file work runs on a small bounded pool, never on the event loop
+        self.io_executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("INTESA_IO_WORKERS", "4")),
+            thread_name_prefix="session-io"
+        )
+        # session -> [lock, operations using it]; dropped once nobody holds or waits on it
+        self._io_locks: Dict[str, list] = {}
+        self._pending_io: Dict[Hashable, asyncio.Future] = {}
+    
+    @property
+    def fake(self):
+        # Importing and building Faker is the slowest part of startup, so it waits until a code is needed
+        if self._fake is None:
+            with self._fake_lock:
+                if self._fake is None:
+                    from faker import Faker
+                    self._fake = Faker(['it_IT', 'en_US'])  # Italian and English for variety
+        return self._fake
+    
+    def prewarm(self):
+        """Build everything that is otherwise initialized on first use"""
+        print("Prewarming session manager")
+        self.sessions_dir.mkdir(exist_ok=True)
+        self.fake.slug()
+        self._load_word_deck()
+        print("Session manager prewarmed")
+    
+    def _load_word_deck(self) -> Optional[list]:
+        """Contents of the repo-level words.json, re-read only when the file changes"""
+        repo_words_file = Path("words.json")
+        try:
+            mtime = repo_words_file.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+        
+        with self._word_deck_lock:
+            if self._word_deck is None or self._word_deck_mtime != mtime:
+                self._word_deck = json.loads(repo_words_file.read_text())
+                self._word_deck_mtime = mtime
+            return self._word_deck
     
     def _generate_session_code(self) -> str:
         """Generate a funny, memorable session code using Faker's built-in providers"""
@@ -22,54 +137,38 @@ class SessionManager:
             lambda: self.fake.slug(),
         ]
         
-        # Pick a random pattern and generate
-        pattern = random.choice(patterns)
-        code = pattern().lower().replace(' ', '-')
+        def draw() -> str:
+            # Pick a random pattern, then clean and limit length
+            code = random.choice(patterns)().lower().replace(' ', '-')
+            return ''.join(c for c in code if c.isalnum() or c == '-')[:20]
         
-        # Clean and limit length
-        code = ''.join(c for c in code if c.isalnum() or c == '-')[:20]
-        
-        # Ensure uniqueness
+        # Ensure uniqueness, and that the router will send the room's clients to this shard
+        code = draw()
         attempts = 0
-        while code in self.active_sessions and attempts < 10:
-            pattern = random.choice(patterns) 
-            code = pattern().lower().replace(' ', '-')
-            code = ''.join(c for c in code if c.isalnum() or c == '-')[:20]
+        while code in self.active_sessions or not self.owns_session(code):
             attempts += 1
-            
+            if attempts > 100 * self.shard_count:
+                raise HTTPException(status_code=503, detail="Could not allocate a session code")
+            if attempts < 10 * self.shard_count:
+                code = draw()
+            else:
+                # Plain slugs keep colliding, a numeric suffix widens the space
+                code = f"{draw()[:16]}-{random.randint(0, 999)}"
+        
         return code
     
-    def create_session(self, api_key: str) -> str:
-        if api_key != self.api_key:
-            raise HTTPException(status_code=403, detail="Invalid API key")
-        
-        session_code = self._generate_session_code()
+    def owns_session(self, session_code: str) -> bool:
+        return shard_for_session(session_code, self.shard_count) == self.shard_index
+    
+    def get_session(self, session_uuid: str) -> Optional[Session]:
+        return self.active_sessions.get(session_uuid)
+    
+    def _create_session_files(self, session_code: str):
         session_dir = self.sessions_dir / session_code
-        session_dir.mkdir(exist_ok=True)
+        session_dir.mkdir(parents=True, exist_ok=True)
         
         # Create default word files
         self._create_default_files(session_dir)
-        
-        # Initialize session state
-        self.active_sessions[session_code] = {
-            "uuid": session_code,
-            "state": "lobby",
-            "connected_clients": [],
-            "timer": 60,
-            "stats": {
-                "correct": 0,
-                "incorrect": 0,
-                "total_points": 0
-            },
-            "current_word": None,
-            "pass_count": 0,
-            "need_new_word": False
-        }
-        
-        return session_code
-    
-    def get_session(self, session_uuid: str) -> dict:
-        return self.active_sessions.get(session_uuid)
     
     def _create_default_files(self, session_dir: Path):
         used_words_file = session_dir / "used_words.json"
@@ -79,31 +178,17 @@ class SessionManager:
     
     def get_available_words(self, session_uuid: str) -> list:
         # Use repo-level words.json
-        repo_words_file = Path("words.json")
+        all_words = self._load_word_deck()
         session_dir = self.sessions_dir / session_uuid
         used_words_file = session_dir / "used_words.json"
         
-        if not repo_words_file.exists() or not used_words_file.exists():
+        if all_words is None or not used_words_file.exists():
             return []
         
-        all_words = json.loads(repo_words_file.read_text())
-        used_words = json.loads(used_words_file.read_text())
+        used_words = set(json.loads(used_words_file.read_text()))
         
         return [word for word in all_words if word not in used_words]
     
-    def pick_new_word(self, session_uuid: str) -> str:
-        import random
-        available_words = self.get_available_words(session_uuid)
-        if not available_words:
-            return None
-        
-        word = random.choice(available_words)
-        session = self.get_session(session_uuid)
-        if session:
-            session["current_word"] = word
-        
-        return word
-    
     def mark_word_used(self, session_uuid: str, word: str):
         print(f"Marking word '{word}' as used for session {session_uuid}")
         session_dir = self.sessions_dir / session_uuid
@@ -138,33 +223,113 @@ class SessionManager:
         else:
             print(f"Used words file does not exist: {used_words_file}")
     
-    def validate_and_join_session(self, api_key: str, session_code: str) -> str:
-        """Validate API key and allow controller to rejoin an existing session"""
+    def _session_exists_on_disk(self, session_code: str) -> bool:
+        return (self.sessions_dir / session_code).exists()
+    
+    # Async API: the blocking methods above run on the I/O pool so handlers never touch the disk directly
+    
+    async def _run_io(self, session_uuid: str, func, *args):
+        """Run blocking file work on the I/O pool, one operation per session at a time"""
+        entry = self._io_locks.get(session_uuid)
+        if entry is None:
+            entry = self._io_locks[session_uuid] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(self.io_executor, func, *args)
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._io_locks[session_uuid]
+    
+    async def _coalesced_io(self, key: Hashable, session_uuid: str, func, *args):
+        """Share one in-flight operation between concurrent identical requests"""
+        pending = self._pending_io.get(key)
+        if pending is None:
+            pending = asyncio.ensure_future(self._run_io(session_uuid, func, *args))
+            self._pending_io[key] = pending
+            
+            def _forget(future):
+                if self._pending_io.get(key) is future:
+                    del self._pending_io[key]
+            pending.add_done_callback(_forget)
+        
+        # Shield so one cancelled waiter doesn't cancel the operation for everyone else
+        return await asyncio.shield(pending)
+    
+    def _invalidate_pending_reads(self, session_uuid: str):
+        # Reads issued after a write must not join a read that started before it
+        self._pending_io.pop(("available_words", session_uuid), None)
+    
+    async def create_session_async(self, api_key: str) -> str:
+        if api_key != self.api_key:
+            raise HTTPException(status_code=403, detail="Invalid API key")
+        
+        # Build Faker off the event loop if prewarm hasn't done it yet
+        if self._fake is None:
+            await asyncio.get_running_loop().run_in_executor(self.io_executor, lambda: self.fake)
+        
+        # Reserve the code before yielding so concurrent creates can't pick it too
+        session_code = self._generate_session_code()
+        self.active_sessions[session_code] = Session(session_code)
+        
+        try:
+            await self._run_io(session_code, self._create_session_files, session_code)
+        except Exception:
+            del self.active_sessions[session_code]
+            raise
+        
+        return session_code
+    
+    async def get_available_words_async(self, session_uuid: str) -> list:
+        words = await self._coalesced_io(
+            ("available_words", session_uuid), session_uuid, self.get_available_words, session_uuid
+        )
+        # Callers share the result, hand each one its own copy
+        return list(words)
+    
+    async def pick_new_word_async(self, session_uuid: str) -> str:
+        available_words = await self.get_available_words_async(session_uuid)
+        if not available_words:
+            return None
+        
+        word = random.choice(available_words)
+        session = self.get_session(session_uuid)
+        if session:
+            session.current_word = word
+            session.changed()
+        
+        return word
+    
+    async def mark_word_used_async(self, session_uuid: str, word: str):
+        self._invalidate_pending_reads(session_uuid)
+        await self._coalesced_io(
+            ("mark_word_used", session_uuid, word), session_uuid, self.mark_word_used, session_uuid, word
+        )
+    
+    async def clear_used_words_async(self, session_uuid: str):
+        self._invalidate_pending_reads(session_uuid)
+        await self._coalesced_io(
+            ("clear_used_words", session_uuid), session_uuid, self.clear_used_words, session_uuid
+        )
+    
+    async def validate_and_join_session_async(self, api_key: str, session_code: str) -> str:
+        """Validate API key and allow controller to rejoin an existing session, checking the disk on the I/O pool"""
         if api_key != self.api_key:
             raise HTTPException(status_code=403, detail="Invalid API key")
         
-        # Check if session exists in active sessions or on disk
         if session_code not in self.active_sessions:
-            # Try to load from disk
-            session_dir = self.sessions_dir / session_code
-            if session_dir.exists():
-                # Recreate session in memory from disk
-                self.active_sessions[session_code] = {
-                    "uuid": session_code,
-                    "state": "lobby",
-                    "connected_clients": [],
-                    "timer": 60,
-                    "stats": {
-                        "correct": 0,
-                        "incorrect": 0,
-                        "total_points": 0
-                    },
-                    "current_word": None,
-                    "pass_count": 0,
-                    "need_new_word": False
-                }
-                return session_code
-            else:
+            # Read-only probe for a client-supplied code, no per-session lock needed
+            loop = asyncio.get_running_loop()
+            exists = await loop.run_in_executor(self.io_executor, self._session_exists_on_disk, session_code)
+            if not exists:
                 raise HTTPException(status_code=404, detail="Session not found")
+            # Another request may have loaded it while we were waiting on the disk
+            if session_code not in self.active_sessions:
+                self.active_sessions[session_code] = Session(session_code)
         
-        return session_code
\ No newline at end of file
+        return session_code
+    
+    def shutdown(self):
+        self.io_executor.shutdown(wait=True)
@@ -0,0 +1,81 @@
+import os
+import sys
+import time
+import socket
+import zlib
+import argparse
+import subprocess
+
+
+def shard_for_session(session_code: str, shard_count: int) -> int:
+    """Stable mapping from a session code to the shard that owns it"""
+    return zlib.crc32(session_code.encode("utf-8")) % shard_count
+
+
+def shard_addresses() -> list:
+    """host:port of every shard, in shard index order"""
+    shard_count = int(os.getenv("INTESA_SHARD_COUNT", "1"))
+    host = os.getenv("INTESA_SHARD_HOST", "127.0.0.1")
+    base_port = int(os.getenv("INTESA_SHARD_BASE_PORT", "9900"))
+    return [f"{host}:{base_port + index}" for index in range(shard_count)]
+
+
+def _wait_for_port(host: str, port: int, timeout: float):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with socket.create_connection((host, port), timeout=1):
+                return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Shard on {host}:{port} did not start within {timeout}s")
+            time.sleep(0.1)
+
+
+def run_sharded(shards: int, host: str, port: int, base_port: int, router_workers: int = None):
+    """Start one game server process per shard, then the router in front of them.
+    
+    The router keeps no state, so it runs several workers; by default one for every two shards.
+    """
+    if router_workers is None:
+        # Every message crosses the router too, and one worker tops out at about one core of proxying
+        router_workers = max(1, shards // 2)
+    
+    os.environ["INTESA_SHARD_COUNT"] = str(shards)
+    os.environ["INTESA_SHARD_BASE_PORT"] = str(base_port)
+    os.environ.setdefault("INTESA_SHARD_HOST", "127.0.0.1")
+    shard_host = os.environ["INTESA_SHARD_HOST"]
+    
+    processes = []
+    try:
+        for index in range(shards):
+            env = dict(os.environ, INTESA_SHARD_INDEX=str(index))
+            processes.append(subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", f"{__package__}.server:app",
+                 "--host", shard_host, "--port", str(base_port + index)],
+                env=env
+            ))
+        
+        for index in range(shards):
+            _wait_for_port(shard_host, base_port + index, timeout=30)
+        print(f"{shards} shards running on ports {base_port}-{base_port + shards - 1}")
+        
+        import uvicorn
+        uvicorn.run(f"{__package__}.router:app", host=host, port=port, workers=router_workers)
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the game server as several shard processes behind a router")
+    parser.add_argument("--shards", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--base-port", type=int, default=int(os.getenv("INTESA_SHARD_BASE_PORT", "9900")))
+    parser.add_argument("--router-workers", type=int, default=None,
+                        help="router processes; a single one caps throughput at one core (default: shards / 2)")
+    args = parser.parse_args()
+    run_sharded(args.shards, args.host, args.port, args.base_port, args.router_workers)
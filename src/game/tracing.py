@@ -0,0 +1,165 @@
+import os
+import time
+import bisect
+import itertools
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+# Bucket upper bounds in milliseconds; anything slower lands in the overflow bucket
+HISTOGRAM_BOUNDS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+# Trace of the inbound message currently being handled, picked up by the send path
+current_trace: ContextVar[Optional["Trace"]] = ContextVar("current_trace", default=None)
+
+
+class LatencyHistogram:
+    __slots__ = ("counts", "count", "total_ms", "max_ms")
+    
+    def __init__(self):
+        self.counts = [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+    
+    def record(self, value_ms: float):
+        self.counts[bisect.bisect_left(HISTOGRAM_BOUNDS_MS, value_ms)] += 1
+        self.count += 1
+        self.total_ms += value_ms
+        self.max_ms = max(self.max_ms, value_ms)
+    
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th quantile"""
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(HISTOGRAM_BOUNDS_MS, self.counts):
+            seen += count
+            if seen >= target:
+                return min(bound, self.max_ms)
+        return self.max_ms
+    
+    def to_dict(self) -> dict:
+        labels = [f"<={bound}" for bound in HISTOGRAM_BOUNDS_MS] + [f">{HISTOGRAM_BOUNDS_MS[-1]}"]
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "p50_ms": round(self.quantile(0.5), 3),
+            "p95_ms": round(self.quantile(0.95), 3),
+            "p99_ms": round(self.quantile(0.99), 3),
+            "max_ms": round(self.max_ms, 3),
+            "buckets": dict(zip(labels, self.counts))
+        }
+
+
+class Trace:
+    """Timestamps (perf_counter_ns) of one inbound message and the frames it caused"""
+    __slots__ = ("id", "session_uuid", "event_type", "client_type", "received_at", "handler_started_at",
+                 "encoded_at", "recipients")
+    
+    def __init__(self, trace_id: int, session_uuid: str, event_type: str, client_type: str, received_at: int):
+        self.id = trace_id
+        self.session_uuid = session_uuid
+        self.event_type = event_type
+        self.client_type = client_type
+        self.received_at = received_at
+        self.handler_started_at = None
+        self.encoded_at = None
+        # connection id -> [client_type, first frame sent at, acknowledged at]
+        self.recipients: Dict[int, list] = {}
+    
+    def to_dict(self) -> dict:
+        def since_receive(timestamp):
+            return None if timestamp is None else round((timestamp - self.received_at) / 1e6, 3)
+        
+        return {
+            "trace_id": self.id,
+            "event_type": self.event_type,
+            "client_type": self.client_type,
+            "handler_start_ms": since_receive(self.handler_started_at),
+            "encode_ms": since_receive(self.encoded_at),
+            "recipients": [
+                {"connection": connection_id, "client_type": client_type,
+                 "sent_ms": since_receive(sent_at), "acked_ms": since_receive(acked_at)}
+                for connection_id, (client_type, sent_at, acked_at) in self.recipients.items()
+            ]
+        }
+
+
+class Tracer:
+    """Follows inbound messages through the broadcast path to every client's acknowledgement.
+    
+    Clients echo the trace_id of frames they receive; the ack gives the round trip for that
+    recipient, from which the one-way delivery latency is estimated as half the send-to-ack time.
+    """
+    
+    def __init__(self):
+        self._trace_ids = itertools.count(1)
+        # Traces still waiting for acknowledgements, oldest evicted first
+        self.pending: OrderedDict = OrderedDict()
+        self.max_pending = int(os.getenv("INTESA_TRACE_PENDING", "4096"))
+        self.histograms: Dict[tuple, LatencyHistogram] = {}
+        # Optional per-session dump of recent traces
+        self.dump_size = int(os.getenv("INTESA_TRACE_DUMP", "0"))
+        self.session_traces: Dict[str, deque] = {}
+    
+    def start(self, session_uuid: str, event_type: str, client_type: str, received_at: int) -> Trace:
+        trace = Trace(next(self._trace_ids), session_uuid, event_type, client_type, received_at)
+        self.pending[trace.id] = trace
+        if len(self.pending) > self.max_pending:
+            self.pending.popitem(last=False)
+        
+        if self.dump_size:
+            self.session_traces.setdefault(session_uuid, deque(maxlen=self.dump_size)).append(trace)
+        return trace
+    
+    def handler_started(self, trace: Trace):
+        trace.handler_started_at = time.perf_counter_ns()
+        self._record("receive_to_handler_ms", "event", trace.event_type, trace.received_at, trace.handler_started_at)
+    
+    def encoded(self, trace: Trace):
+        # Only the first frame counts, later ones are follow-ups to the same event
+        if trace.encoded_at is None:
+            trace.encoded_at = time.perf_counter_ns()
+            self._record("receive_to_encode_ms", "event", trace.event_type, trace.received_at, trace.encoded_at)
+    
+    def sent(self, trace: Trace, connection_id: int, client_type: str):
+        if connection_id in trace.recipients:
+            return
+        
+        sent_at = time.perf_counter_ns()
+        trace.recipients[connection_id] = [client_type, sent_at, None]
+        self._record("receive_to_send_ms", "event", trace.event_type, trace.received_at, sent_at)
+    
+    def acknowledged(self, trace_id, connection_id: int):
+        # trace_id comes straight from the client
+        if not isinstance(trace_id, int):
+            return
+        
+        trace = self.pending.get(trace_id)
+        recipient = trace.recipients.get(connection_id) if trace else None
+        if not recipient or recipient[2] is not None:
+            return
+        
+        client_type, sent_at, _ = recipient
+        acked_at = recipient[2] = time.perf_counter_ns()
+        # Receive to first byte on the client: time on the server plus half the round trip
+        delivered_at = sent_at + (acked_at - sent_at) // 2
+        for dimension, label in (("event", trace.event_type), ("client", client_type)):
+            self._record("end_to_end_ms", dimension, label, trace.received_at, delivered_at)
+            self._record("round_trip_ms", dimension, label, sent_at, acked_at)
+    
+    def _record(self, metric: str, dimension: str, label: str, start: int, end: int):
+        key = (metric, dimension, label)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = LatencyHistogram()
+        histogram.record((end - start) / 1e6)
+    
+    def export(self) -> dict:
+        metrics = {}
+        for (metric, dimension, label), histogram in sorted(self.histograms.items()):
+            metrics.setdefault(metric, {}).setdefault(dimension, {})[label] = histogram.to_dict()
+        return metrics
+    
+    def dump(self, session_uuid: str) -> list:
+        return [trace.to_dict() for trace in self.session_traces.get(session_uuid, ())]
@@ -1,151 +1,365 @@
+import os
+import json
+import time
 import asyncio
-import uuid
+import itertools
+from collections import deque
 from typing import Dict
 from fastapi import WebSocket, WebSocketDisconnect
-from .session_manager import SessionManager
+from .session_manager import Session, SessionManager
+from .tracing import Trace, Tracer, current_trace
+
+# Player roles that may only be held by one socket at a time; overlays can be opened on any number of screens
+SINGLE_OCCUPANCY_ROLES = {"controller", "word_giver_1", "word_giver_2", "word_guesser"}
+
+# Client roles with their own latency histograms; the role comes from the client, so anything else is "other"
+TRACED_CLIENT_TYPES = SINGLE_OCCUPANCY_ROLES | {"overlay"}
+
+# Inbound message types with their own latency histograms; anything else is grouped as "other"
+TRACED_MESSAGE_TYPES = {
+    "ping", "get_state", "test_connection", "start_game", "stop_game", "adjust_timer", "adjust_stats",
+    "mark_word_correct", "mark_word_incorrect", "pass_word", "request_guess", "reset_game"
+}
+
+# Frames that only carry the latest value, so an older queued copy can be replaced by a newer one
+MERGEABLE_MESSAGE_TYPES = {"timer_update"}
+
+
+class OutgoingQueue:
+    """Bounded per-connection send buffer so one slow client never stalls a broadcast"""
+    
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.items = deque()
+        self.ready = asyncio.Event()
+    
+    def put(self, message_type: str, text: str, trace: Trace = None) -> bool:
+        """Queue an encoded frame, returns False if the client has fallen too far behind"""
+        if message_type in MERGEABLE_MESSAGE_TYPES:
+            self._remove_first(message_type)
+        
+        if len(self.items) >= self.maxsize:
+            # Make room by dropping the oldest stale frame, if there is one
+            if not any(self._remove_first(stale_type) for stale_type in MERGEABLE_MESSAGE_TYPES):
+                return False
+        
+        self.items.append((message_type, text, trace))
+        self.ready.set()
+        return True
+    
+    async def get(self):
+        while not self.items:
+            self.ready.clear()
+            await self.ready.wait()
+        return self.items.popleft()
+    
+    def _remove_first(self, message_type: str) -> bool:
+        for item in self.items:
+            if item[0] == message_type:
+                self.items.remove(item)
+                return True
+        return False
+
+
+class Connection:
+    """A client socket together with the session and role it joined as"""
+    __slots__ = ("id", "websocket", "session_uuid", "client_type", "queue", "sender", "closing")
+    
+    def __init__(self, connection_id: int, websocket: WebSocket, session_uuid: str, client_type: str, queue_size: int):
+        self.id = connection_id
+        self.websocket = websocket
+        self.session_uuid = session_uuid
+        self.client_type = client_type
+        self.queue = OutgoingQueue(queue_size)
+        self.sender = None
+        self.closing = False
+
 
 class WebSocketManager:
     def __init__(self):
-        self.connections: Dict[str, WebSocket] = {}
-        # Track which session and client type each connection belongs to
-        self.connection_metadata: Dict[str, Dict] = {}
+        self.connections: Dict[int, Connection] = {}
+        # Connections grouped by session so a broadcast only touches its own room
+        self.session_connections: Dict[str, Dict[int, Connection]] = {}
+        self._connection_ids = itertools.count(1)
         self.session_manager = None
         self.timer_tasks: Dict[str, asyncio.Task] = {}
+        self.tracer = Tracer()
+        
+        # Admission control limits
+        self.handshake_timeout = float(os.getenv("INTESA_HANDSHAKE_TIMEOUT", "10"))
+        self.max_connections = int(os.getenv("INTESA_MAX_CONNECTIONS", "1000"))
+        self.max_session_connections = int(os.getenv("INTESA_MAX_SESSION_CONNECTIONS", "16"))
+        self.send_queue_size = int(os.getenv("INTESA_SEND_QUEUE_SIZE", "32"))
+        # Admitted sockets, including those still in the handshake
+        self.admitted_count = 0
+        self.session_admitted_counts: Dict[str, int] = {}
     
     def set_session_manager(self, session_manager: SessionManager):
         self.session_manager = session_manager
     
     async def connect(self, websocket: WebSocket, session_uuid: str, client_type: str = None):
-        await websocket.accept()
-        
+        # Check everything before registering anything, so a connection storm costs as little as possible
         if not self.session_manager:
-            await websocket.send_json({"error": "Server not initialized"})
-            await websocket.close()
+            await self._reject(websocket, 1011, "Server not initialized")
             return
         
         session = self.session_manager.get_session(session_uuid)
         if not session:
-            await websocket.send_json({"error": "Session not found"})
-            await websocket.close()
+            await self._reject(websocket, 4404, "Session not found")
+            return
+        
+        if not self._admit(session_uuid):
+            print(f"Rejecting connection to session {session_uuid}: connection limit reached")
+            await self._reject(websocket, 1013, "Too many connections")
             return
         
         connection_id = None  # Initialize connection_id before try block
-        initialized_client_type = client_type  # Keep track of client_type for error handling
         
         try:
+            await websocket.accept()
+            
             # If client_type not provided, wait for connect message
             if client_type is None:
-                first_message = await websocket.receive_json()
+                try:
+                    first_message = await asyncio.wait_for(websocket.receive_json(), timeout=self.handshake_timeout)
+                except asyncio.TimeoutError:
+                    await websocket.send_json({"error": "Handshake timed out"})
+                    await websocket.close(code=1008)
+                    return
+                
                 if first_message.get("type") == "connect":
                     client_type = first_message.get("client_type")
                     if not client_type:
                         await websocket.send_json({"error": "Client type required"})
                         await websocket.close()
                         return
+                    if not isinstance(client_type, str):
+                        # Roles are kept in a set, so anything unhashable would crash the session later
+                        await websocket.send_json({"error": "Invalid client type"})
+                        await websocket.close()
+                        return
                 else:
                     await websocket.send_json({"error": "Expected connect message"})
                     await websocket.close()
                     return
             
             # Store connection with unique ID
-            connection_id = str(uuid.uuid4())
-            self.connections[connection_id] = websocket
-            self.connection_metadata[connection_id] = {
-                "session_uuid": session_uuid,
-                "client_type": client_type
-            }
+            connection_id = next(self._connection_ids)
+            connection = Connection(connection_id, websocket, session_uuid, client_type, self.send_queue_size)
+            connection.sender = asyncio.create_task(self._run_sender(connection))
+            self.connections[connection_id] = connection
+            self.session_connections.setdefault(session_uuid, {})[connection_id] = connection
             print(f"Connection established: {connection_id} for {client_type} in session {session_uuid}")
             print(f"Total connections now: {len(self.connections)}")
             
+            if client_type in SINGLE_OCCUPANCY_ROLES:
+                self._replace_stale_connections(session_uuid, client_type, connection_id)
+            
             # Add to session
-            if client_type not in session["connected_clients"]:
-                session["connected_clients"].append(client_type)
+            if session.add_client(client_type):
                 print(f"Added {client_type} to session {session_uuid} connected_clients")
             
-            # Send initial state (with error handling in case connection closes quickly)
-            try:
-                await self._send_session_state(websocket, session)
-                await self._handle_messages(websocket, session_uuid, client_type, connection_id)
-            except WebSocketDisconnect:
-                print(f"WebSocket disconnected during initial setup for {client_type}")
+            await self._send_session_state(connection_id, session)
+            await self._handle_messages(websocket, session_uuid, client_type, connection_id)
         except WebSocketDisconnect:
-            if connection_id and client_type:
-                await self._disconnect(connection_id, session, client_type)
-            else:
-                print(f"WebSocket disconnected before establishing connection (client_type: {initialized_client_type})")
+            if not connection_id:
+                print(f"WebSocket disconnected before establishing connection (client_type: {client_type})")
         except Exception as e:
             print(f"Unexpected error in WebSocket connection: {e}")
-            if connection_id and connection_id in self.connections and client_type:
+        finally:
+            if connection_id:
                 await self._disconnect(connection_id, session, client_type)
+            else:
+                self._release(session_uuid)
+    
+    async def _reject(self, websocket: WebSocket, code: int, error: str):
+        # Closing before accept() reaches the client as a bare HTTP 403, so accept first
+        # to let it see the error message and close code
+        try:
+            await websocket.accept()
+            await websocket.send_json({"error": error})
+            await websocket.close(code=code, reason=error)
+        except Exception as e:
+            print(f"Failed to reject WebSocket: {e}")
+    
+    def _admit(self, session_uuid: str) -> bool:
+        session_count = self.session_admitted_counts.get(session_uuid, 0)
+        if self.admitted_count >= self.max_connections or session_count >= self.max_session_connections:
+            return False
+        
+        self.admitted_count += 1
+        self.session_admitted_counts[session_uuid] = session_count + 1
+        return True
+    
+    def _release(self, session_uuid: str):
+        self.admitted_count -= 1
+        self.session_admitted_counts[session_uuid] -= 1
+        if self.session_admitted_counts[session_uuid] == 0:
+            del self.session_admitted_counts[session_uuid]
+    
+    def _replace_stale_connections(self, session_uuid: str, client_type: str, connection_id: int):
+        """Close older sockets holding the same role, e.g. a phone that reconnected without closing"""
+        for conn_id, connection in list(self.session_connections.get(session_uuid, {}).items()):
+            if conn_id != connection_id and connection.client_type == client_type:
+                print(f"Replacing stale {client_type} connection {conn_id} in session {session_uuid}")
+                self._close_connection(conn_id, 4000, "Replaced by a newer connection")
+                # Don't wait for a dead socket to finish the close handshake before forgetting it
+                self._forget_connection(conn_id)
     
-    async def _handle_messages(self, websocket: WebSocket, session_uuid: str, client_type: str, connection_id: str):
+    def _forget_connection(self, connection_id: int) -> bool:
+        connection = self.connections.pop(connection_id, None)
+        if not connection:
+            return False
+        
+        # A replaced socket gives up its admission slot now, not when its receive loop ends
+        self._release(connection.session_uuid)
+        connection.sender.cancel()
+        session_connections = self.session_connections[connection.session_uuid]
+        del session_connections[connection_id]
+        if not session_connections:
+            del self.session_connections[connection.session_uuid]
+        return True
+    
+    def _close_connection(self, connection_id: int, code: int, reason: str):
+        # Cleanup happens in connect() once the socket's receive loop notices the close
+        connection = self.connections.get(connection_id)
+        if not connection or connection.closing:
+            return
+        
+        connection.closing = True
+        connection.sender.cancel()
+        asyncio.create_task(self._close_quietly(connection.websocket, code, reason))
+    
+    async def _close_quietly(self, websocket: WebSocket, code: int, reason: str):
+        try:
+            await websocket.close(code=code, reason=reason)
+        except Exception as e:
+            print(f"Failed to close WebSocket: {e}")
+    
+    async def _run_sender(self, connection: Connection):
+        traced_client_type = connection.client_type if connection.client_type in TRACED_CLIENT_TYPES else "other"
+        try:
+            while True:
+                _, text, trace = await connection.queue.get()
+                await connection.websocket.send_text(text)
+                if trace:
+                    self.tracer.sent(trace, connection.id, traced_client_type)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print(f"Failed to send message on connection {connection.id}: {e}")
+            self._close_connection(connection.id, 1011, "Send failed")
+    
+    def _send(self, connection_id: int, message: dict):
+        trace = current_trace.get()
+        self._enqueue(connection_id, message.get("type"), self._encode(message, trace), trace)
+    
+    def _enqueue(self, connection_id: int, message_type: str, text: str, trace: Trace = None):
+        connection = self.connections.get(connection_id)
+        if not connection or connection.closing:
+            return
+        
+        if not connection.queue.put(message_type, text, trace):
+            print(f"Connection {connection_id} ({connection.client_type}) fell behind, dropping it")
+            self._close_connection(connection_id, 1013, "Client too slow")
+    
+    def _encode(self, message: dict, trace: Trace = None) -> str:
+        # Same encoding as WebSocket.send_json, done once per message instead of once per recipient
+        if trace:
+            message = {**message, "trace_id": trace.id}
+        text = json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+        if trace:
+            self.tracer.encoded(trace)
+        return text
+    
+    def _encode_session_state(self, session: Session, trace: Trace = None) -> str:
+        # Splice in the session's cached JSON rather than re-encoding the whole state
+        if not trace:
+            return '{"type":"session_state","session":' + session.serialized() + '}'
+        
+        text = '{"type":"session_state","trace_id":' + str(trace.id) + ',"session":' + session.serialized() + '}'
+        self.tracer.encoded(trace)
+        return text
+    
+    async def _handle_messages(self, websocket: WebSocket, session_uuid: str, client_type: str, connection_id: int):
+        traced_client_type = client_type if client_type in TRACED_CLIENT_TYPES else "other"
         while True:
-            data = await websocket.receive_json()
+            text = await websocket.receive_text()
+            received_at = time.perf_counter_ns()
+            data = json.loads(text)
             session = self.session_manager.get_session(session_uuid)
             
             if not session:
                 await websocket.send_json({"error": "Session not found"})
                 break
             
-            if data.get("type") == "ping":
-                await websocket.send_json({"type": "pong"})
-            
-            elif data.get("type") == "get_state":
-                print("get_state - sending response")
-                await self._send_session_state(websocket, session)
-                print("get_state - response sent")
-            
-            elif data.get("type") == "test_connection":
-                print("test_connection - sending response")
-                await websocket.send_json({
-                    "type": "test_response",
-                    "message": "Connection test successful",
-                    "client_type": client_type,
-                    "session_uuid": session_uuid
-                })
-                print("test_connection - response sent")
-            
-            elif data.get("type") == "start_game" and client_type == "controller":
-                await self._start_game(session_uuid)
-            
-            elif data.get("type") == "stop_game" and client_type == "controller":
-                await self._stop_game(session_uuid)
-            
-            elif data.get("type") == "adjust_timer" and client_type == "controller":
-                seconds = data.get("seconds", 0)
-                await self._adjust_timer(session_uuid, seconds)
-            
-            elif data.get("type") == "adjust_stats" and client_type == "controller":
-                stat_type = data.get("stat_type")
-                delta = data.get("delta", 0)
-                await self._adjust_stats(session_uuid, stat_type, delta)
-            
-            elif data.get("type") == "mark_word_correct" and client_type == "controller":
-                await self._mark_word_correct(session_uuid)
-            
-            elif data.get("type") == "mark_word_incorrect" and client_type == "controller":
-                await self._mark_word_incorrect(session_uuid)
+            # Clients echo the trace_id of frames they receive so delivery latency can be measured
+            if data.get("type") == "ack":
+                self.tracer.acknowledged(data.get("trace_id"), connection_id)
+                continue
             
-            elif data.get("type") == "pass_word" and client_type in ["word_giver_1", "word_giver_2"]:
-                await self._pass_word(session_uuid, websocket)
+            event_type = data.get("type") if data.get("type") in TRACED_MESSAGE_TYPES else "other"
+            trace = self.tracer.start(session_uuid, event_type, traced_client_type, received_at)
+            token = current_trace.set(trace)
+            self.tracer.handler_started(trace)
             
-            elif data.get("type") == "request_guess" and client_type == "word_guesser":
-                print(f"Word guesser requesting guess for session {session_uuid}")
-                await self._request_guess(session_uuid)
-            
-            elif data.get("type") == "reset_game" and client_type == "controller":
-                await self._reset_game(session_uuid)
+            try:
+                if data.get("type") == "ping":
+                    self._send(connection_id, {"type": "pong"})
+                
+                elif data.get("type") == "get_state":
+                    print("get_state - sending response")
+                    await self._send_session_state(connection_id, session)
+                    print("get_state - response sent")
+                
+                elif data.get("type") == "test_connection":
+                    print("test_connection - sending response")
+                    self._send(connection_id, {
+                        "type": "test_response",
+                        "message": "Connection test successful",
+                        "client_type": client_type,
+                        "session_uuid": session_uuid
+                    })
+                    print("test_connection - response sent")
+                
+                elif data.get("type") == "start_game" and client_type == "controller":
+                    await self._start_game(session_uuid)
+                
+                elif data.get("type") == "stop_game" and client_type == "controller":
+                    await self._stop_game(session_uuid)
+                
+                elif data.get("type") == "adjust_timer" and client_type == "controller":
+                    seconds = data.get("seconds", 0)
+                    await self._adjust_timer(session_uuid, seconds)
+                
+                elif data.get("type") == "adjust_stats" and client_type == "controller":
+                    stat_type = data.get("stat_type")
+                    delta = data.get("delta", 0)
+                    await self._adjust_stats(session_uuid, stat_type, delta)
+                
+                elif data.get("type") == "mark_word_correct" and client_type == "controller":
+                    await self._mark_word_correct(session_uuid)
+                
+                elif data.get("type") == "mark_word_incorrect" and client_type == "controller":
+                    await self._mark_word_incorrect(session_uuid)
+                
+                elif data.get("type") == "pass_word" and client_type in ["word_giver_1", "word_giver_2"]:
+                    await self._pass_word(session_uuid, connection_id)
+                
+                elif data.get("type") == "request_guess" and client_type == "word_guesser":
+                    print(f"Word guesser requesting guess for session {session_uuid}")
+                    await self._request_guess(session_uuid)
+                
+                elif data.get("type") == "reset_game" and client_type == "controller":
+                    await self._reset_game(session_uuid)
+            finally:
+                # The trace must not outlive its message, e.g. into the disconnect broadcast
+                current_trace.reset(token)
     
-    async def _send_session_state(self, websocket: WebSocket, session: dict):
-        print(f"Sending session state: {session}")
-        try:
-            await websocket.send_json({
-                "type": "session_state",
-                "session": session
-            })
-            print("Session state sent")
-        except Exception as e:
-            print(f"Failed to send session state: {e}")
+    async def _send_session_state(self, connection_id: int, session: Session):
+        print(f"Sending session state: {session.serialized()}")
+        trace = current_trace.get()
+        self._enqueue(connection_id, "session_state", self._encode_session_state(session, trace), trace)
     
     async def _start_game(self, session_uuid: str):
         session = self.session_manager.get_session(session_uuid)
@@ -153,7 +367,7 @@ class WebSocketManager:
             return
         
         # Always pick a new word when starting the game
-        word = self.session_manager.pick_new_word(session_uuid)
+        word = await self.session_manager.pick_new_word_async(session_uuid)
         if not word:
             await self._broadcast_to_session(session_uuid, {
                 "type": "error",  
@@ -162,14 +376,15 @@ class WebSocketManager:
             return
         
         # Set the new word
-        session["current_word"] = word
+        session.current_word = word
         
         # If timer is 0 or doesn't exist, set to 60
-        if not session.get("timer") or session["timer"] == 0:
-            session["timer"] = 60
+        if not session.timer or session.timer == 0:
+            session.timer = 60
         
         # Start/resume game
-        session["state"] = "playing"
+        session.state = "playing"
+        session.changed()
         
         # Start timer
         if session_uuid in self.timer_tasks:
@@ -186,7 +401,8 @@ class WebSocketManager:
         if not session:
             return
         
-        session["state"] = "paused"
+        session.state = "paused"
+        session.changed()
         
         # Stop timer
         if session_uuid in self.timer_tasks:
@@ -200,7 +416,8 @@ class WebSocketManager:
         if not session:
             return
         
-        session["timer"] = max(0, session["timer"] + seconds)
+        session.timer = max(0, session.timer + seconds)
+        session.changed()
         
         await self._broadcast_session_state(session_uuid)
     
@@ -211,63 +428,70 @@ class WebSocketManager:
         
         # Manual adjustments - each stat is independent
         if stat_type == "correct":
-            session["stats"]["correct"] = max(0, session["stats"]["correct"] + delta)
+            session.correct = max(0, session.correct + delta)
         elif stat_type == "incorrect":
-            session["stats"]["incorrect"] = max(0, session["stats"]["incorrect"] + delta)
+            session.incorrect = max(0, session.incorrect + delta)
         elif stat_type == "total_points":
-            session["stats"]["total_points"] = session["stats"]["total_points"] + delta
+            session.total_points = session.total_points + delta
+        session.changed()
         
         await self._broadcast_session_state(session_uuid)
     
     async def _mark_word_correct(self, session_uuid: str):
         print(f"_mark_word_correct called for session {session_uuid}")
         session = self.session_manager.get_session(session_uuid)
-        if not session or not session.get("current_word"):
+        if not session or not session.current_word:
             print("No session or current word found")
             return
         
-        current_word = session["current_word"]
+        current_word = session.current_word
         print(f"Marking word '{current_word}' as correct")
         
-        # Mark word as used and update stats
-        self.session_manager.mark_word_used(session_uuid, current_word)
-        session["stats"]["correct"] += 1
-        session["stats"]["total_points"] += 1
+        # Update stats before persisting so the state change isn't split by the disk write
+        session.correct += 1
+        session.total_points += 1
         
         # Pause game - controller needs to start next round
-        session["state"] = "paused"
+        session.state = "paused"
+        session.changed()
         
         # Stop timer if running
         if session_uuid in self.timer_tasks:
             self.timer_tasks[session_uuid].cancel()
             del self.timer_tasks[session_uuid]
         
+        # Mark word as used
+        await self.session_manager.mark_word_used_async(session_uuid, current_word)
+        
         await self._broadcast_session_state(session_uuid)
     
     async def _mark_word_incorrect(self, session_uuid: str):
         print(f"_mark_word_incorrect called for session {session_uuid}")
         session = self.session_manager.get_session(session_uuid)
-        if not session or not session.get("current_word"):
+        if not session or not session.current_word:
             print("No session or current word found")
             return
         
-        current_word = session["current_word"]
+        current_word = session.current_word
         print(f"Marking word '{current_word}' as incorrect")
         
-        # Mark word as used and update stats
-        self.session_manager.mark_word_used(session_uuid, current_word)
-        session["stats"]["incorrect"] += 1
+        # Update stats before persisting so the state change isn't split by the disk write
+        session.incorrect += 1
         # Prevent negative points
-        session["stats"]["total_points"] = max(0, session["stats"]["total_points"] - 1)
+        session.total_points = max(0, session.total_points - 1)
         
         # Pause game - controller needs to start next round
-        session["state"] = "paused"
+        session.state = "paused"
+        session.changed()
         
         # Stop timer if running
         if session_uuid in self.timer_tasks:
             self.timer_tasks[session_uuid].cancel()
             del self.timer_tasks[session_uuid]
         
+        # Mark word as used
+        await self.session_manager.mark_word_used_async(session_uuid, current_word)
+        
         await self._broadcast_session_state(session_uuid)
     
     
@@ -277,11 +501,12 @@ class WebSocketManager:
             return
         
         # Pick a new word
-        word = self.session_manager.pick_new_word(session_uuid)
+        word = await self.session_manager.pick_new_word_async(session_uuid)
         if not word:
             # No more words available
-            session["state"] = "paused"
-            session["current_word"] = None
+            session.state = "paused"
+            session.current_word = None
+            session.changed()
             if session_uuid in self.timer_tasks:
                 self.timer_tasks[session_uuid].cancel()
                 del self.timer_tasks[session_uuid]
@@ -292,11 +517,12 @@ class WebSocketManager:
             })
         else:
             # Continue with new word, reset timer to 60
-            session["current_word"] = word
-            session["timer"] = 60
+            session.current_word = word
+            session.timer = 60
+            session.changed()
             
             # Restart timer if game was playing
-            if session["state"] == "playing":
+            if session.state == "playing":
                 if session_uuid in self.timer_tasks:
                     self.timer_tasks[session_uuid].cancel()
                 
@@ -306,22 +532,23 @@ class WebSocketManager:
         
         await self._broadcast_session_state(session_uuid)
     
-    async def _pass_word(self, session_uuid: str, websocket: WebSocket):
+    async def _pass_word(self, session_uuid: str, connection_id: int):
         """Handle word pass - stops the game (controller must restart)"""
         session = self.session_manager.get_session(session_uuid)
         if not session:
             return
         
         # Check if pass limit reached (3 passes per game)
-        if session.get("pass_count", 0) >= 3:
-            await websocket.send_json({
+        if session.pass_count >= 3:
+            self._send(connection_id, {
                 "type": "error",
                 "message": "Pass limit reached (3 per game)"
             })
             return
         
         # Increment pass count
-        session["pass_count"] = session.get("pass_count", 0) + 1
+        session.pass_count += 1
+        session.changed()
         
         # Broadcast pass event to all clients (especially controller for buzz sound)
         await self._broadcast_to_session(session_uuid, {
@@ -330,7 +557,8 @@ class WebSocketManager:
         })
         
         # Just stop the game - new word will be picked when controller presses inizia gioco
-        session["state"] = "paused"
+        session.state = "paused"
+        session.changed()
         
         # Stop timer
         if session_uuid in self.timer_tasks:
@@ -347,7 +575,7 @@ class WebSocketManager:
             print("No session found")
             return
         
-        print(f"Current session state: {session['state']}")
+        print(f"Current session state: {session.state}")
         
         # Broadcast guess event to all clients (especially controller for buzz sound)
         await self._broadcast_to_session(session_uuid, {
@@ -356,7 +584,8 @@ class WebSocketManager:
         })
         
         # Stop the game
-        session["state"] = "guessing"
+        session.state = "guessing"
+        session.changed()
         
         # Stop timer
         if session_uuid in self.timer_tasks:
@@ -373,6 +602,8 @@ class WebSocketManager:
     
     async def _start_guess_countdown(self, session_uuid: str):
         """Run 5-second countdown for guessing"""
+        # Later ticks aren't caused by the message that started the countdown
+        current_trace.set(None)
         for seconds in range(5, 0, -1):
             await self._broadcast_to_session(session_uuid, {
                 "type": "countdown",
@@ -388,7 +619,8 @@ class WebSocketManager:
         
         session = self.session_manager.get_session(session_uuid)
         if session:
-            session["state"] = "paused"
+            session.state = "paused"
+            session.changed()
             await self._broadcast_session_state(session_uuid)
     
     async def _reset_game(self, session_uuid: str):
@@ -404,43 +636,48 @@ class WebSocketManager:
             del self.timer_tasks[session_uuid]
         
         # Reset session state
-        session["state"] = "lobby"
-        session["timer"] = 60
-        session["current_word"] = None
-        session["stats"]["correct"] = 0
-        session["stats"]["incorrect"] = 0
-        session["stats"]["total_points"] = 0
-        session["pass_count"] = 0  # Reset pass count on game reset
-        session["need_new_word"] = False  # Reset need_new_word flag
-        session["saved_timer"] = None  # Clear any saved timer
+        session.state = "lobby"
+        session.timer = 60
+        session.current_word = None
+        session.correct = 0
+        session.incorrect = 0
+        session.total_points = 0
+        session.pass_count = 0  # Reset pass count on game reset
+        session.need_new_word = False  # Reset need_new_word flag
+        session.saved_timer = None  # Clear any saved timer
+        session.changed()
         
         # Clear used words
-        self.session_manager.clear_used_words(session_uuid)
+        await self.session_manager.clear_used_words_async(session_uuid)
         
         print(f"Game reset for session {session_uuid}")
         await self._broadcast_session_state(session_uuid)
     
     async def _run_timer(self, session_uuid: str):
+        # Timer ticks aren't caused by the message that started the timer
+        current_trace.set(None)
         try:
             while True:
                 session = self.session_manager.get_session(session_uuid)
-                if not session or session["timer"] <= 0:
+                if not session or session.timer <= 0:
                     break
                 
                 await asyncio.sleep(1)
-                session["timer"] -= 1
+                session.timer -= 1
+                session.changed()
                 
                 # Broadcast timer update
                 await self._broadcast_to_session(session_uuid, {
                     "type": "timer_update",
-                    "timer": session["timer"]
+                    "timer": session.timer
                 })
                 
             # Timer expired - start guess countdown automatically
             session = self.session_manager.get_session(session_uuid)
             if session:
                 print(f"Timer expired for session {session_uuid}, starting guess countdown")
-                session["state"] = "guessing"
+                session.state = "guessing"
+                session.changed()
                 await self._broadcast_session_state(session_uuid)
                 
                 # Start 5-second countdown automatically
@@ -452,46 +689,36 @@ class WebSocketManager:
     async def _broadcast_session_state(self, session_uuid: str):
         session = self.session_manager.get_session(session_uuid)
         if session:
-            await self._broadcast_to_session(session_uuid, {
-                "type": "session_state",
-                "session": session
-            })
+            trace = current_trace.get()
+            self._broadcast_encoded(session_uuid, "session_state", self._encode_session_state(session, trace), trace)
     
     async def _broadcast_to_session(self, session_uuid: str, message: dict):
-        # Find all connections for this session using metadata
-        session_connections = []
-        for conn_id, metadata in self.connection_metadata.items():
-            if metadata["session_uuid"] == session_uuid and conn_id in self.connections:
-                session_connections.append((conn_id, self.connections[conn_id], metadata["client_type"]))
-        
-        print(f"Broadcasting to session {session_uuid}: {len(session_connections)} connections found")
-        print(f"Connection details: {[(conn_id, client_type) for conn_id, _, client_type in session_connections]}")
+        trace = current_trace.get()
+        self._broadcast_encoded(session_uuid, message.get("type"), self._encode(message, trace), trace)
+    
+    def _broadcast_encoded(self, session_uuid: str, message_type: str, text: str, trace: Trace = None):
+        session_connections = self.session_connections.get(session_uuid, {})
+        print(f"Broadcasting {message_type} to session {session_uuid}: {len(session_connections)} connections found")
         
-        for conn_id, websocket, client_type in session_connections:
-            try:
-                await websocket.send_json(message)
-                print(f"Message sent successfully to {client_type} (connection {conn_id})")
-            except Exception as e:
-                print(f"Failed to send message to {client_type} (connection {conn_id}): {e}")
-                # Connection might be closed, remove it
-                if conn_id in self.connections:
-                    del self.connections[conn_id]
-                if conn_id in self.connection_metadata:
-                    del self.connection_metadata[conn_id]
-    
-    async def _disconnect(self, connection_id: str, session: dict, client_type: str):
+        # Hand the already-encoded frame to each connection's send queue
+        for connection_id in list(session_connections):
+            self._enqueue(connection_id, message_type, text, trace)
+    
+    async def _disconnect(self, connection_id: int, session: Session, client_type: str):
         """Handle client disconnection"""
-        print(f"Client {client_type} disconnected from session {session['uuid']} (connection {connection_id})")
+        print(f"Client {client_type} disconnected from session {session.uuid} (connection {connection_id})")
         
-        # Remove from connections
-        if connection_id in self.connections:
-            del self.connections[connection_id]
-        if connection_id in self.connection_metadata:
-            del self.connection_metadata[connection_id]
+        # Remove from connections, nothing else to do if it was already replaced
+        if not self._forget_connection(connection_id):
+            return
         
-        # Remove from session
-        if client_type in session["connected_clients"]:
-            session["connected_clients"].remove(client_type)
+        # Remove from session unless another socket still holds the role
+        still_connected = any(
+            connection.client_type == client_type
+            for connection in self.session_connections.get(session.uuid, {}).values()
+        )
+        if not still_connected:
+            session.remove_client(client_type)
         
         # Broadcast updated state
-        await self._broadcast_session_state(session["uuid"])
\ No newline at end of file
+        await self._broadcast_session_state(session.uuid)
@@ -1,5 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import './Overlay.css';
+import { ackTrace } from './utils/network';
 
 interface GameState {
   current_word: string;
@@ -40,6 +41,7 @@ const Overlay: React.FC = () => {
 
     ws.onmessage = (event) => {
       const data = JSON.parse(event.data);
+      ackTrace(ws, data);
       console.log('Overlay received message:', data);
       
       if (data.type === 'session_state') {
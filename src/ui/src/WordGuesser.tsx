@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import './App.css';
-import { getLocalIP, getBaseURL, getWebSocketURL } from './utils/network';
+import { getLocalIP, getBaseURL, getWebSocketURL, ackTrace } from './utils/network';
 
 interface SessionData {
   uuid: string;
@@ -25,6 +25,7 @@ interface WebSocketMessage {
   session_uuid?: string;
   timer?: number;
   seconds?: number;
+  trace_id?: number;
 }
 
 interface WordGuesserProps {
@@ -58,6 +59,7 @@ function WordGuesser({ sessionUuid, localIP, onLeaveSession }: WordGuesserProps)
 
     ws.onmessage = (event) => {
       const data: WebSocketMessage = JSON.parse(event.data);
+      ackTrace(ws, data);
       console.log('WebSocket message received:', data);
       
       if (data.type === 'session_state' && data.session) {
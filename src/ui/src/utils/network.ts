@@ -78,4 +78,17 @@ export const getWebSocketURL = (ip: string = 'localhost', uuid: string) => {
   }
   // Development mode - use detected IP
   return `ws://${ip}:8000/ws/${uuid}`;
-};
\ No newline at end of file
+};
+
+// Echo a frame's trace_id so the server can measure delivery latency (once per trace)
+const lastAckedTrace = new WeakMap<WebSocket, number>();
+
+export const ackTrace = (ws: WebSocket, message: { trace_id?: number }) => {
+  if (message.trace_id === undefined || lastAckedTrace.get(ws) === message.trace_id) {
+    return;
+  }
+  lastAckedTrace.set(ws, message.trace_id);
+  if (ws.readyState === WebSocket.OPEN) {
+    ws.send(JSON.stringify({ type: 'ack', trace_id: message.trace_id }));
+  }
+};